@@ -57,7 +57,8 @@ export class DomainQueue {
             try {
               const configOptions = {
                 domain: domainName,
-                projectId
+                projectId,
+                idempotencyKey: this.idempotencyKey('verification', job.id, domainName, 'nginx')
               };
               
               Logger.info(`[DOMAIN_QUEUE] Generating Nginx config for ${domainName} before updating status`);
@@ -79,7 +80,11 @@ export class DomainQueue {
           }
           
           // Now update domain status to active
-          await domainsService.updateDomainStatus(domainId, DomainStatus.ACTIVE);
+          await domainsService.updateDomainStatus(
+            domainId,
+            DomainStatus.ACTIVE,
+            this.idempotencyKey('verification', job.id, domainName, 'setup')
+          );
           await domainsService.updateDomainVerificationAttempt(domainId, `Attempt ${retryCount + 1}: Verification successful!`);
           
           // Only add SSL generation job if we're in production and Nginx config was successful
@@ -154,7 +159,11 @@ export class DomainQueue {
           Logger.info(`[SSL_QUEUE] Requesting SSL certificate for ${domainName} via Sudo API`);
           
           // Use the new SSLManager
-          const certificate = await SSLManager.requestCertificate(domainName, projectId);
+          const certificate = await SSLManager.requestCertificate(
+            domainName,
+            projectId,
+            this.idempotencyKey('ssl', job.id, domainName, 'certificate')
+          );
           
           if (!certificate.isValid) {
             Logger.error(`[SSL_QUEUE] Failed to generate SSL certificate for ${domainName}`);
@@ -177,14 +186,19 @@ export class DomainQueue {
               domain: domainName,
               projectId,
               sslCertPath: certificate.certPath,
-              sslKeyPath: certificate.keyPath
+              sslKeyPath: certificate.keyPath,
+              idempotencyKey: this.idempotencyKey('ssl', job.id, domainName, 'nginx')
             });
             
             const reloadSuccess = await DomainLib.reloadNginx();
             
             if (reloadSuccess) {
               Logger.info(`[SSL_QUEUE] Nginx reloaded successfully with SSL config for ${domainName}`);
-              await domainsService.updateDomainStatus(domainId, DomainStatus.ACTIVE);
+              await domainsService.updateDomainStatus(
+                domainId,
+                DomainStatus.ACTIVE,
+                this.idempotencyKey('ssl', job.id, domainName, 'setup')
+              );
             } else {
               Logger.error(`[SSL_QUEUE] Failed to reload Nginx with SSL config for ${domainName}`);
               // Don't fail the job, certificate is still valid
@@ -209,6 +223,16 @@ export class DomainQueue {
     this.initialized = true;
     Logger.info('Domain queue initialized');
   }
+
+  /**
+   * Idempotency-Key for a Sudo API call made by a queue job.
+   * Bull keeps the job id across retry attempts, so a retry replays the earlier
+   * response instead of running certbot or reloading nginx again.
+   */
+  private static idempotencyKey(queue: string, jobId: Queue.JobId, domainName: string, step: string): string {
+    return `${queue}-${jobId}-${domainName}-${step}`;
+  }
+
   static async addVerificationJob(domain: DomainData, verificationToken: string): Promise<void> {
     // Make sure we have a clean job queue for this domain
     const existingJobs = await this.verificationQueue.getJobs(['active', 'waiting', 'delayed']);
@@ -29,6 +29,7 @@ export interface NginxConfigOptions {
   projectId: string;
   sslCertPath?: string;
   sslKeyPath?: string;
+  idempotencyKey?: string;
 }
 
 export class DomainLib {  /**
@@ -138,7 +139,7 @@ export class DomainLib {  /**
         domain: options.domain,
         project_id: options.projectId,
         ssl_enabled: !!options.sslCertPath && !!options.sslKeyPath
-      });
+      }, options.idempotencyKey);
       
       if (!result.success) {
         throw new Error(`Failed to generate Nginx config: ${result.message}`);
@@ -16,7 +16,7 @@ export interface CertificateInfo {
 
 export class SSLManager {
 
-  static async requestCertificate(domain: string, projectId: string): Promise<CertificateInfo> {
+  static async requestCertificate(domain: string, projectId: string, idempotencyKey?: string): Promise<CertificateInfo> {
     try {
       Logger.info(`Requesting SSL certificate for ${domain} via Sudo API`);
       
@@ -24,7 +24,7 @@ export class SSLManager {
         domain,
         project_id: projectId,
         email: env.ADMIN_EMAIL
-      });
+      }, idempotencyKey);
       
       if (!result.success) {
         Logger.error(`Failed to generate SSL certificate for ${domain}: ${result.message}`);
@@ -10,11 +10,16 @@ export interface SudoApiResponse<T = any> {
   error?: string;
 }
 
+export type NginxProfile = 'default' | 'tuned';
+
 export interface DomainSetupRequest {
   domain: string;
   project_id: string;
   ssl_enabled: boolean;
   email: string;
+  profile?: NginxProfile;
+  cache_enabled?: boolean;
+  static_enabled?: boolean;
 }
 
 export interface NginxConfigRequest {
@@ -22,6 +27,24 @@ export interface NginxConfigRequest {
   project_id: string;
   ssl_enabled: boolean;
   config_content?: string;
+  profile?: NginxProfile;
+  cache_enabled?: boolean;
+  static_enabled?: boolean;
+}
+
+export interface StaticReleaseRequest {
+  build_dir: string;
+  domains?: string[];
+}
+
+export interface CachePurgeRequest {
+  domain: string;
+  path?: string;
+}
+
+export interface NginxProfileSwitchRequest {
+  profile: NginxProfile;
+  domains?: string[];
 }
 
 export interface SSLCertificateRequest {
@@ -31,11 +54,38 @@ export interface SSLCertificateRequest {
   force_renewal?: boolean;
 }
 
+export interface WildcardCertificateRequest {
+  email?: string;
+  force_renewal?: boolean;
+  migrate_sites?: boolean;
+  delete_migrated_certs?: boolean;
+}
+
 export interface DomainRequest {
   domain: string;
   project_id: string;
 }
 
+export type SudoApiEventType =
+  | 'nginx.config.deployed'
+  | 'nginx.config.removed'
+  | 'nginx.reload.completed'
+  | 'nginx.reload.failed'
+  | 'cert.issued'
+  | 'cert.renewed'
+  | 'cert.removed'
+  | 'cert.expiring'
+  | 'stream.reset';
+
+export interface SudoApiEvent<T = any> {
+  id: string | null;
+  epoch: string;
+  seq: number | null;
+  type: SudoApiEventType;
+  timestamp: string;
+  data: T;
+}
+
 /**
  * HTTP client for communicating with the Python Sudo API
  */
@@ -43,7 +93,8 @@ export class SudoApiClient {
   private static async makeRequest<T>(
     method: 'GET' | 'POST',
     endpoint: string,
-    data?: any
+    data?: any,
+    idempotencyKey?: string
   ): Promise<SudoApiResponse<T>> {
     try {
       const url = `${SUDO_API_BASE_URL}${endpoint}`;
@@ -58,6 +109,11 @@ export class SudoApiClient {
         timeout: 300000, // 5 minutes timeout for long operations
       };
 
+      // Lets a retried call reuse the result of the original instead of running it again
+      if (idempotencyKey) {
+        options.headers['Idempotency-Key'] = idempotencyKey;
+      }
+
       if (data && method === 'POST') {
         options.body = JSON.stringify(data);
       }
@@ -84,6 +140,14 @@ export class SudoApiClient {
     }
   }
 
+  /**
+   * URL of the server-sent events stream of domain state changes, resuming after the event id `since` when given
+   */
+  static getEventsUrl(since?: string): string {
+    const query = since ? `?since=${encodeURIComponent(since)}` : '';
+    return `${SUDO_API_BASE_URL}/events${query}`;
+  }
+
   /**
    * Check health of the Sudo API
    */
@@ -94,8 +158,8 @@ export class SudoApiClient {
   /**
    * Deploy Nginx configuration for a domain
    */
-  static async deployNginxConfig(request: NginxConfigRequest): Promise<SudoApiResponse> {
-    return this.makeRequest('POST', '/nginx/deploy', request);
+  static async deployNginxConfig(request: NginxConfigRequest, idempotencyKey?: string): Promise<SudoApiResponse> {
+    return this.makeRequest('POST', '/nginx/deploy', request, idempotencyKey);
   }
 
   /**
@@ -105,6 +169,20 @@ export class SudoApiClient {
     return this.makeRequest('POST', '/nginx/remove', request);
   }
 
+  /**
+   * Regenerate existing site configs with a different Nginx profile
+   */
+  static async switchNginxProfile(request: NginxProfileSwitchRequest): Promise<SudoApiResponse> {
+    return this.makeRequest('POST', '/nginx/profile', request);
+  }
+
+  /**
+   * Point every site serving static assets at a new build directory
+   */
+  static async releaseStaticBuild(request: StaticReleaseRequest): Promise<SudoApiResponse> {
+    return this.makeRequest('POST', '/nginx/static-release', request);
+  }
+
   /**
    * Get Nginx configuration status for a domain
    */
@@ -112,11 +190,18 @@ export class SudoApiClient {
     return this.makeRequest('GET', `/nginx/status/${domain}`);
   }
 
+  /**
+   * Drop edge cache entries for a domain, or a path prefix within it
+   */
+  static async purgeCache(request: CachePurgeRequest): Promise<SudoApiResponse> {
+    return this.makeRequest('POST', '/cache/purge', request);
+  }
+
   /**
    * Generate SSL certificate for a domain
    */
-  static async generateSSLCertificate(request: SSLCertificateRequest): Promise<SudoApiResponse> {
-    return this.makeRequest('POST', '/ssl/generate', request);
+  static async generateSSLCertificate(request: SSLCertificateRequest, idempotencyKey?: string): Promise<SudoApiResponse> {
+    return this.makeRequest('POST', '/ssl/generate', request, idempotencyKey);
   }
 
   /**
@@ -133,6 +218,27 @@ export class SudoApiClient {
     return this.makeRequest('GET', `/ssl/status/${domain}`);
   }
 
+  /**
+   * Issue the platform wildcard certificate through DNS-01
+   */
+  static async generateWildcardCertificate(request: WildcardCertificateRequest = {}): Promise<SudoApiResponse> {
+    return this.makeRequest('POST', '/ssl/wildcard/generate', request);
+  }
+
+  /**
+   * Renew the platform wildcard certificate
+   */
+  static async renewWildcardCertificate(): Promise<SudoApiResponse> {
+    return this.makeRequest('POST', '/ssl/wildcard/renew');
+  }
+
+  /**
+   * Get the platform wildcard certificate status
+   */
+  static async getWildcardStatus(): Promise<SudoApiResponse> {
+    return this.makeRequest('GET', '/ssl/wildcard/status');
+  }
+
   /**
    * Remove SSL certificate for a domain
    */
@@ -143,8 +249,8 @@ export class SudoApiClient {
   /**
    * Complete domain setup (Nginx + SSL)
    */
-  static async setupDomain(request: DomainSetupRequest): Promise<SudoApiResponse> {
-    return this.makeRequest('POST', '/domain/complete-setup', request);
+  static async setupDomain(request: DomainSetupRequest, idempotencyKey?: string): Promise<SudoApiResponse> {
+    return this.makeRequest('POST', '/domain/complete-setup', request, idempotencyKey);
   }
 
   /**
@@ -416,7 +416,7 @@ export class DomainsService {
     }
 
 
-    static async updateDomainStatus(domainId: string, status: DomainStatus): Promise<DomainData> {
+    static async updateDomainStatus(domainId: string, status: DomainStatus, idempotencyKey?: string): Promise<DomainData> {
         try {
             const domain = await DomainModel.findById(domainId);
             if (!domain) {
@@ -439,7 +439,7 @@ export class DomainsService {
                             project_id: domain.project,
                             ssl_enabled: true,
                             email: env.ADMIN_EMAIL
-                        });
+                        }, idempotencyKey);
 
                         if (setupResult.success) {
                             Logger.info(`Domain setup completed for ${domain.name} via Python API`);
@@ -21,10 +21,44 @@ class Config:
     NGINX_SITES_ENABLED: str = os.getenv("NGINX_SITES_ENABLED", "/etc/nginx/sites-enabled")
     NGINX_CONFIG_DIR: str = os.getenv("NGINX_CONFIG_DIR", "/home/msuser/nginx-configs")
     NGINX_TEMPLATES_DIR: str = os.getenv("NGINX_TEMPLATES_DIR", "/home/msuser/nginx-templates")
+    NGINX_CONF_D: str = os.getenv("NGINX_CONF_D", "/etc/nginx/conf.d")
+    NGINX_DEFAULT_PROFILE: str = os.getenv("NGINX_DEFAULT_PROFILE", "default")
+    
+    WWW_UPSTREAM: str = os.getenv("WWW_UPSTREAM", "127.0.0.1:8081")
+    WWW_UPSTREAM_KEEPALIVE: int = int(os.getenv("WWW_UPSTREAM_KEEPALIVE", "64"))
+    NGINX_RESOLVER: str = os.getenv("NGINX_RESOLVER", "1.1.1.1 8.8.8.8")
+    
+    NGINX_CACHE_DIR: str = os.getenv("NGINX_CACHE_DIR", "/var/cache/nginx/halogen")
+    NGINX_CACHE_KEYS_SIZE: str = os.getenv("NGINX_CACHE_KEYS_SIZE", "50m")
+    NGINX_CACHE_MAX_SIZE: str = os.getenv("NGINX_CACHE_MAX_SIZE", "2g")
+    NGINX_CACHE_INACTIVE: str = os.getenv("NGINX_CACHE_INACTIVE", "7d")
+    NGINX_CACHE_TTL: str = os.getenv("NGINX_CACHE_TTL", "10m")
+    
+    WWW_BUILD_DIR: str = os.getenv("WWW_BUILD_DIR", "")
+    NGINX_BROTLI_STATIC: bool = os.getenv("NGINX_BROTLI_STATIC", "False").lower() == "true"
     
     WEBROOT_DIR: str = os.getenv("WEBROOT_DIR", "/var/www/certbot")
     CERTBOT_LIVE_DIR: str = os.getenv("CERTBOT_LIVE_DIR", "/etc/letsencrypt/live")
     DEFAULT_EMAIL: str = os.getenv("DEFAULT_EMAIL", "admin@example.com")
+    ACME_SERVER: str = os.getenv("ACME_SERVER", "")
+    
+    PLATFORM_DOMAIN: str = os.getenv("PLATFORM_DOMAIN", "mortarstudio.site")
+    WILDCARD_CERT_NAME: str = os.getenv("WILDCARD_CERT_NAME", "mortarstudio.site-wildcard")
+    DNS_PROVIDER: str = os.getenv("DNS_PROVIDER", "")
+    DNS_PROVIDER_URL: str = os.getenv("DNS_PROVIDER_URL", "http://localhost:8055")
+    DNS_PROVIDER_COMMAND: str = os.getenv("DNS_PROVIDER_COMMAND", "")
+    DNS_PROPAGATION_SECONDS: int = int(os.getenv("DNS_PROPAGATION_SECONDS", "30"))
+    
+    SITE_STATE_RESCAN_INTERVAL: int = int(os.getenv("SITE_STATE_RESCAN_INTERVAL", "300"))
+    
+    IDEMPOTENCY_TTL: int = int(os.getenv("IDEMPOTENCY_TTL", "3600"))
+    IDEMPOTENCY_MAX_ENTRIES: int = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "1000"))
+    
+    EVENTS_BUFFER_SIZE: int = int(os.getenv("EVENTS_BUFFER_SIZE", "1000"))
+    EVENTS_KEEPALIVE_SECONDS: int = int(os.getenv("EVENTS_KEEPALIVE_SECONDS", "15"))
+    EVENTS_RETRY_MS: int = int(os.getenv("EVENTS_RETRY_MS", "3000"))
+    CERT_EXPIRY_WARNING_DAYS: int = int(os.getenv("CERT_EXPIRY_WARNING_DAYS", "14"))
+    CERT_EXPIRY_CHECK_INTERVAL: int = int(os.getenv("CERT_EXPIRY_CHECK_INTERVAL", "3600"))
     
     ALLOWED_ORIGINS: List[str] = os.getenv(
         "ALLOWED_ORIGINS", 
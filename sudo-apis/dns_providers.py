@@ -0,0 +1,126 @@
+import json
+import logging
+import os
+import shlex
+import subprocess
+import sys
+import time
+import urllib.request
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Type
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class DNSProvider(ABC):
+    """Publishes and removes the _acme-challenge TXT records used for DNS-01 validation."""
+
+    @classmethod
+    @abstractmethod
+    def from_config(cls) -> "DNSProvider":
+        ...
+
+    @abstractmethod
+    def add_txt_record(self, name: str, value: str) -> None:
+        ...
+
+    @abstractmethod
+    def remove_txt_record(self, name: str, value: str) -> None:
+        ...
+
+
+class ChallTestSrvProvider(DNSProvider):
+    """Talks to the management API of pebble-challtestsrv, a stand-in DNS server for testing."""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+
+    @classmethod
+    def from_config(cls) -> "ChallTestSrvProvider":
+        return cls(config.DNS_PROVIDER_URL)
+
+    def add_txt_record(self, name: str, value: str) -> None:
+        self._post("/set-txt", {"host": f"{name}.", "value": value})
+
+    def remove_txt_record(self, name: str, value: str) -> None:
+        self._post("/clear-txt", {"host": f"{name}."})
+
+    def _post(self, path: str, payload: dict) -> None:
+        request = urllib.request.Request(
+            f"{self.url}{path}",
+            data=json.dumps(payload).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=30) as response:
+            response.read()
+
+
+class CommandProvider(DNSProvider):
+    """Runs DNS_PROVIDER_COMMAND as `<command> add|remove <name> <value>`, for providers without a built-in hook."""
+
+    def __init__(self, command: str):
+        self.command = command
+
+    @classmethod
+    def from_config(cls) -> "CommandProvider":
+        if not config.DNS_PROVIDER_COMMAND:
+            raise ValueError("DNS_PROVIDER_COMMAND must be set for the command DNS provider")
+        return cls(config.DNS_PROVIDER_COMMAND)
+
+    def add_txt_record(self, name: str, value: str) -> None:
+        subprocess.run([self.command, "add", name, value], check=True)
+
+    def remove_txt_record(self, name: str, value: str) -> None:
+        subprocess.run([self.command, "remove", name, value], check=True)
+
+
+DNS_PROVIDERS: Dict[str, Type[DNSProvider]] = {
+    "challtestsrv": ChallTestSrvProvider,
+    "command": CommandProvider,
+}
+
+
+def get_dns_provider(name: Optional[str] = None) -> DNSProvider:
+    name = name or config.DNS_PROVIDER
+    provider_class = DNS_PROVIDERS.get(name)
+    if provider_class is None:
+        raise ValueError(f"Unknown DNS provider: {name or '(not configured)'}")
+    return provider_class.from_config()
+
+
+def certbot_hook_command(action: str) -> str:
+    # certbot runs the hook through a shell and stores it in the renewal config
+    return f"{shlex.quote(sys.executable)} {shlex.quote(os.path.abspath(__file__))} {action}"
+
+
+def main() -> int:
+    # Entry point for certbot's --manual-auth-hook / --manual-cleanup-hook
+    logging.basicConfig(level=getattr(logging, config.LOG_LEVEL), format=config.LOG_FORMAT)
+
+    if len(sys.argv) != 2 or sys.argv[1] not in ("auth", "cleanup"):
+        print(f"Usage: {sys.argv[0]} auth|cleanup", file=sys.stderr)
+        return 2
+
+    record_name = f"_acme-challenge.{os.environ['CERTBOT_DOMAIN']}"
+    validation = os.environ["CERTBOT_VALIDATION"]
+    provider = get_dns_provider()
+
+    if sys.argv[1] == "auth":
+        provider.add_txt_record(record_name, validation)
+        logger.info(f"Published TXT record {record_name} via {config.DNS_PROVIDER}")
+
+        # certbot calls the hook once per challenge; wait for propagation after the last one only
+        if os.environ.get("CERTBOT_REMAINING_CHALLENGES", "0") == "0":
+            time.sleep(config.DNS_PROPAGATION_SECONDS)
+    else:
+        provider.remove_txt_record(record_name, validation)
+        logger.info(f"Removed TXT record {record_name} via {config.DNS_PROVIDER}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
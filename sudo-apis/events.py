@@ -0,0 +1,133 @@
+import asyncio
+import json
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import AsyncIterator, Optional, Tuple
+
+NGINX_CONFIG_DEPLOYED = "nginx.config.deployed"
+NGINX_CONFIG_REMOVED = "nginx.config.removed"
+NGINX_RELOAD_COMPLETED = "nginx.reload.completed"
+NGINX_RELOAD_FAILED = "nginx.reload.failed"
+CERT_ISSUED = "cert.issued"
+CERT_RENEWED = "cert.renewed"
+CERT_REMOVED = "cert.removed"
+CERT_EXPIRING = "cert.expiring"
+STREAM_RESET = "stream.reset"
+
+
+class EventBus:
+    """Buffers domain state events under a monotonic sequence number and fans them out to subscribers.
+
+    Sequence numbers restart with every process, so each process also gets a
+    random epoch and event ids take the form ``<epoch>-<seq>``. Subscribers
+    resume from the last id they saw. When that id belongs to another epoch or
+    has already left the buffer, they get a stream.reset event and should
+    re-read the state they care about.
+    """
+
+    def __init__(self, buffer_size: int = 1000):
+        self.epoch = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self.subscribers = 0
+        self._events = deque(maxlen=buffer_size)
+        self._published: Optional[asyncio.Event] = None
+
+    def publish(self, event_type: str, data: dict) -> dict:
+        self.seq += 1
+        event = {
+            "id": f"{self.epoch}-{self.seq}",
+            "epoch": self.epoch,
+            "seq": self.seq,
+            "type": event_type,
+            "timestamp": datetime.now().isoformat(),
+            "data": data
+        }
+        self._events.append(event)
+
+        if self._published is not None:
+            self._published.set()
+            self._published = None
+
+        return event
+
+    def stats(self) -> dict:
+        return {
+            "epoch": self.epoch,
+            "seq": self.seq,
+            "buffered": len(self._events),
+            "oldest_seq": self._events[0]["seq"] if self._events else None,
+            "subscribers": self.subscribers
+        }
+
+    async def subscribe(
+        self,
+        after_seq: Optional[int] = None,
+        epoch: Optional[str] = None,
+        keepalive: float = 15.0
+    ) -> AsyncIterator[Optional[dict]]:
+        """Yield events newer than ``after_seq`` of ``epoch``; yields None every ``keepalive`` seconds without events."""
+        self.subscribers += 1
+        try:
+            if after_seq is None:
+                after_seq = self.seq
+            elif (
+                epoch != self.epoch
+                or after_seq > self.seq
+                or (self._events and after_seq < self._events[0]["seq"] - 1)
+            ):
+                yield self._reset_event(epoch, after_seq)
+                after_seq = self._events[0]["seq"] - 1 if self._events else 0
+
+            while True:
+                pending = [event for event in self._events if event["seq"] > after_seq]
+                if pending and pending[0]["seq"] > after_seq + 1:
+                    # Fell behind the buffer while waiting
+                    yield self._reset_event(self.epoch, after_seq)
+
+                for event in pending:
+                    after_seq = event["seq"]
+                    yield event
+
+                # Events published while the consumer was handling this batch
+                if self.seq > after_seq:
+                    continue
+
+                if self._published is None:
+                    self._published = asyncio.Event()
+                try:
+                    await asyncio.wait_for(self._published.wait(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self.subscribers -= 1
+
+    def _reset_event(self, epoch: Optional[str], after_seq: int) -> dict:
+        return {
+            "id": None,
+            "epoch": self.epoch,
+            "seq": None,
+            "type": STREAM_RESET,
+            "timestamp": datetime.now().isoformat(),
+            "data": {
+                "requested_epoch": epoch,
+                "requested_seq": after_seq,
+                "oldest_seq": self._events[0]["seq"] if self._events else None
+            }
+        }
+
+
+def parse_event_id(event_id: str) -> Tuple[Optional[str], int]:
+    """Split an ``<epoch>-<seq>`` event id; a bare sequence number has no epoch. Raises ValueError when malformed."""
+    epoch, _, seq = event_id.strip().rpartition("-")
+    if not seq.isdigit():
+        raise ValueError(f"Invalid event id: {event_id}")
+    return epoch or None, int(seq)
+
+
+def format_sse(event: Optional[dict]) -> str:
+    if event is None:
+        return ": keepalive\n\n"
+    # stream.reset carries no id so it does not move the client's Last-Event-ID
+    event_id = f"id: {event['id']}\n" if event["id"] is not None else ""
+    return f"{event_id}event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MUTATING_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+
+class StoredResponse:
+    def __init__(self, status: int, headers: List[Tuple[bytes, bytes]], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class IdempotencyEntry:
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.expires_at: Optional[float] = None
+
+    @property
+    def in_flight(self) -> bool:
+        return not self.future.done()
+
+
+class IdempotencyCache:
+    """Responses of mutating requests keyed by their Idempotency-Key header.
+
+    A repeated key gets the stored response, or waits for the original request
+    if it is still running. Completed entries expire after ``ttl`` seconds and
+    the least recently used ones are evicted beyond ``max_entries``.
+    """
+
+    def __init__(self, ttl: int = 3600, max_entries: int = 1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries: "OrderedDict[str, IdempotencyEntry]" = OrderedDict()
+
+    def reserve(self, key: str, fingerprint: str) -> Tuple[IdempotencyEntry, bool]:
+        self._expire()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry, False
+
+        entry = IdempotencyEntry(fingerprint)
+        self._entries[key] = entry
+        self.misses += 1
+        self._evict()
+        return entry, True
+
+    def complete(self, key: str, entry: IdempotencyEntry, response: StoredResponse) -> None:
+        entry.future.set_result(response)
+
+        # Server errors are not stored so that a retry runs the operation again
+        if response.status >= 500:
+            self._discard(key, entry)
+        else:
+            entry.expires_at = time.monotonic() + self.ttl
+
+    def fail(self, key: str, entry: IdempotencyEntry, error: BaseException) -> None:
+        if not isinstance(error, Exception):
+            error = RuntimeError("Original request was cancelled")
+        entry.future.set_exception(error)
+        # Waiters retrieve the exception; mark it retrieved so asyncio does not log it when nobody waited
+        entry.future.exception()
+        self._discard(key, entry)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "in_flight": sum(1 for entry in self._entries.values() if entry.in_flight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "ttl": self.ttl,
+            "max_entries": self.max_entries
+        }
+
+    def _discard(self, key: str, entry: IdempotencyEntry) -> None:
+        if self._entries.get(key) is entry:
+            del self._entries[key]
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        expired = [
+            key for key, entry in self._entries.items()
+            if entry.expires_at is not None and entry.expires_at <= now
+        ]
+        for key in expired:
+            del self._entries[key]
+
+    def _evict(self) -> None:
+        if len(self._entries) <= self.max_entries:
+            return
+
+        for key in list(self._entries.keys()):
+            if len(self._entries) <= self.max_entries:
+                break
+            if self._entries[key].in_flight:
+                continue
+            del self._entries[key]
+            self.evictions += 1
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware applying an IdempotencyCache to mutating requests that carry an Idempotency-Key."""
+
+    def __init__(self, app, cache: IdempotencyCache, header_name: str = "idempotency-key"):
+        self.app = app
+        self.cache = cache
+        self.header_name = header_name.lower().encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in MUTATING_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        idempotency_key = None
+        for name, value in scope["headers"]:
+            if name == self.header_name:
+                idempotency_key = value.decode("latin-1").strip()
+                break
+
+        if not idempotency_key:
+            await self.app(scope, receive, send)
+            return
+
+        body = b""
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if not message.get("more_body", False):
+                break
+
+        cache_key = f"{scope['method']} {scope['path']} {idempotency_key}"
+        fingerprint = hashlib.sha256(body).hexdigest()
+        entry, is_owner = self.cache.reserve(cache_key, fingerprint)
+
+        if not is_owner:
+            await self._replay(entry, fingerprint, idempotency_key, send)
+            return
+
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status = 500
+        headers: List[Tuple[bytes, bytes]] = []
+        chunks: List[bytes] = []
+
+        async def capture_send(message):
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException as e:
+            self.cache.fail(cache_key, entry, e)
+            raise
+
+        self.cache.complete(cache_key, entry, StoredResponse(status, headers, b"".join(chunks)))
+
+    async def _replay(self, entry: IdempotencyEntry, fingerprint: str, idempotency_key: str, send) -> None:
+        if entry.fingerprint != fingerprint:
+            await self._send_json(send, 422, {
+                "detail": f"Idempotency-Key {idempotency_key} was already used with a different request body"
+            })
+            return
+
+        if entry.in_flight:
+            logger.info(f"Waiting for in-flight request with Idempotency-Key {idempotency_key}")
+
+        try:
+            response = await asyncio.shield(entry.future)
+        except Exception as e:
+            await self._send_json(send, 500, {"detail": f"Original request failed: {e}"})
+            return
+
+        await send({
+            "type": "http.response.start",
+            "status": response.status,
+            "headers": response.headers + [(b"idempotent-replayed", b"true")]
+        })
+        await send({"type": "http.response.body", "body": response.body})
+
+    async def _send_json(self, send, status: int, content: dict) -> None:
+        body = json.dumps(content).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
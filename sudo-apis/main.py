@@ -2,16 +2,23 @@ import asyncio
 import subprocess
 import logging
 from pathlib import Path
-from typing import Dict, List, Optional
-from datetime import datetime
+from typing import Callable, Dict, List, Literal, Optional, Tuple
+from datetime import datetime, timedelta, timezone
 import os
 import shutil
+import json
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 import uvicorn
 from config import config
+from site_state import SiteStateWatcher, format_openssl_date
+from idempotency import IdempotencyCache, IdempotencyMiddleware
+from dns_providers import DNS_PROVIDERS, certbot_hook_command
+import events
+from events import EventBus, format_sse, parse_event_id
 
 logging.basicConfig(
     level=getattr(logging, config.LOG_LEVEL),
@@ -25,6 +32,13 @@ app = FastAPI(
     version="1.0.0"
 )
 
+idempotency_cache = IdempotencyCache(
+    ttl=config.IDEMPOTENCY_TTL,
+    max_entries=config.IDEMPOTENCY_MAX_ENTRIES
+)
+
+app.add_middleware(IdempotencyMiddleware, cache=idempotency_cache)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=config.ALLOWED_ORIGINS,
@@ -39,6 +53,84 @@ NGINX_CONFIG_DIR = config.NGINX_CONFIG_DIR
 NGINX_TEMPLATES_DIR = config.NGINX_TEMPLATES_DIR
 WEBROOT_DIR = config.WEBROOT_DIR
 CERTBOT_LIVE_DIR = config.CERTBOT_LIVE_DIR
+NGINX_CONF_D = config.NGINX_CONF_D
+
+NGINX_PROFILES = ("default", "tuned")
+NGINX_SHARED_CONFIG_NAME = "halogen-tuned.conf"
+NGINX_CACHE_ZONE = "halogen_cache"
+STATIC_RELEASE_FILE_NAME = "static-release.json"
+
+site_state = SiteStateWatcher(
+    NGINX_SITES_AVAILABLE,
+    NGINX_SITES_ENABLED,
+    NGINX_CONFIG_DIR,
+    CERTBOT_LIVE_DIR,
+    rescan_interval=config.SITE_STATE_RESCAN_INTERVAL
+)
+
+event_bus = EventBus(buffer_size=config.EVENTS_BUFFER_SIZE)
+expiry_warnings_sent = set()
+background_tasks: List[asyncio.Task] = []
+
+def publish_certificate_events(domain: str, previous: dict, current: dict) -> None:
+    if not current["certificate_exists"]:
+        if previous["certificate_exists"]:
+            event_bus.publish(events.CERT_REMOVED, {"certificate_name": domain})
+        return
+    
+    not_after = current["certificate_not_after"]
+    if not_after is None:
+        # Unreadable, most likely still being written; the next change carries the dates
+        return
+    
+    data = {
+        "certificate_name": domain,
+        "expiry_date": not_after.isoformat()
+    }
+    
+    if previous["certificate_not_after"] is None:
+        event_bus.publish(events.CERT_ISSUED, data)
+    elif previous["certificate_not_after"] != not_after:
+        event_bus.publish(events.CERT_RENEWED, data)
+    else:
+        return
+    
+    publish_expiry_warnings()
+
+def publish_expiry_warnings() -> None:
+    now = datetime.now(timezone.utc)
+    warning_threshold = now + timedelta(days=config.CERT_EXPIRY_WARNING_DAYS)
+    
+    for domain, state in list(site_state.sites.items()):
+        not_after = state["certificate_not_after"]
+        if not_after is None or not_after > warning_threshold or (domain, not_after) in expiry_warnings_sent:
+            continue
+        
+        expiry_warnings_sent.add((domain, not_after))
+        event_bus.publish(events.CERT_EXPIRING, {
+            "certificate_name": domain,
+            "expiry_date": not_after.isoformat(),
+            "days_remaining": (not_after - now).days
+        })
+
+async def check_certificate_expiry() -> None:
+    while True:
+        publish_expiry_warnings()
+        await asyncio.sleep(config.CERT_EXPIRY_CHECK_INTERVAL)
+
+@app.on_event("startup")
+async def start_site_state_watcher():
+    site_state.add_listener(publish_certificate_events)
+    await site_state.start()
+    background_tasks.append(asyncio.create_task(check_certificate_expiry()))
+
+@app.on_event("shutdown")
+async def stop_site_state_watcher():
+    for task in background_tasks:
+        task.cancel()
+    await site_state.stop()
+
+NginxProfile = Literal["default", "tuned"]
 
 class DomainRequest(BaseModel):
     domain: str = Field(..., description="Domain name")
@@ -47,6 +139,13 @@ class DomainRequest(BaseModel):
 class NginxConfigRequest(DomainRequest):
     ssl_enabled: bool = Field(default=False, description="Enable SSL configuration")
     config_content: Optional[str] = Field(default=None, description="Custom Nginx configuration content")
+    profile: Optional[NginxProfile] = Field(default=None, description="Generated config profile, defaults to NGINX_DEFAULT_PROFILE")
+    cache_enabled: bool = Field(default=False, description="Serve the site through the nginx edge cache")
+    static_enabled: bool = Field(default=False, description="Serve /_next/static assets from the current build directory")
+
+class NginxProfileSwitchRequest(BaseModel):
+    profile: NginxProfile = Field(..., description="Profile to regenerate the site configs with")
+    domains: Optional[List[str]] = Field(default=None, description="Domains to switch, all generated sites when omitted")
 
 class SSLCertificateRequest(DomainRequest):
     email: str = Field(..., description="Email for certificate registration")
@@ -57,6 +156,23 @@ class DomainSetupRequest(BaseModel):
     project_id: str = Field(..., description="Project ID")
     ssl_enabled: bool = Field(default=True, description="Enable SSL")
     email: str = Field(..., description="Email for SSL certificate")
+    profile: Optional[NginxProfile] = Field(default=None, description="Generated config profile, defaults to NGINX_DEFAULT_PROFILE")
+    cache_enabled: bool = Field(default=False, description="Serve the site through the nginx edge cache")
+    static_enabled: bool = Field(default=False, description="Serve /_next/static assets from the current build directory")
+
+class StaticReleaseRequest(BaseModel):
+    build_dir: str = Field(..., description="Next.js build directory (.next) of the new release")
+    domains: Optional[List[str]] = Field(default=None, description="Domains to repoint, all sites serving static assets when omitted")
+
+class WildcardCertificateRequest(BaseModel):
+    email: Optional[str] = Field(default=None, description="Email for certificate registration, defaults to DEFAULT_EMAIL")
+    force_renewal: bool = Field(default=False, description="Force certificate renewal")
+    migrate_sites: bool = Field(default=True, description="Point existing platform subdomain configs at the wildcard certificate")
+    delete_migrated_certs: bool = Field(default=True, description="Delete the per-domain certificates of sites now served by the wildcard certificate")
+
+class CachePurgeRequest(BaseModel):
+    domain: str = Field(..., description="Domain name")
+    path: Optional[str] = Field(default=None, description="Path prefix to purge, the whole domain when omitted")
 
 class ApiResponse(BaseModel):
     success: bool
@@ -89,7 +205,38 @@ async def run_command(command: List[str], check: bool = True) -> subprocess.Comp
         logger.error(f"Error executing command: {e}")
         raise
 
-def generate_nginx_config(domain: str, project_id: str, ssl_enabled: bool = False) -> str:
+def is_platform_subdomain(domain: str) -> bool:
+    suffix = f".{config.PLATFORM_DOMAIN}"
+    return domain.endswith(suffix) and "." not in domain[:-len(suffix)]
+
+def certificate_name_for(domain: str) -> str:
+    # Project subdomains share the platform wildcard certificate once it has been issued
+    if is_platform_subdomain(domain) and site_state.get(config.WILDCARD_CERT_NAME)["certificate_exists"]:
+        return config.WILDCARD_CERT_NAME
+    return domain
+
+def acme_server_args() -> List[str]:
+    return ["--server", config.ACME_SERVER] if config.ACME_SERVER else []
+
+def generate_nginx_config(
+    domain: str,
+    project_id: str,
+    ssl_enabled: bool = False,
+    profile: str = "default",
+    cache_enabled: bool = False,
+    static_build_dir: Optional[str] = None,
+    certificate_name: Optional[str] = None
+) -> str:
+    certificate_name = certificate_name or domain
+    
+    if profile == "tuned":
+        return generate_tuned_nginx_config(
+            domain, project_id, ssl_enabled, cache_enabled, static_build_dir, certificate_name
+        )
+    
+    cache_directives = generate_cache_directives(cache_enabled)
+    static_locations = generate_static_locations(static_build_dir, "http://localhost:8081", ssl_enabled)
+    
     if ssl_enabled:
         return f"""server {{
     listen 80;
@@ -103,8 +250,8 @@ server {{
     listen [::]:443 ssl http2;
     server_name {domain};
 
-    ssl_certificate /etc/letsencrypt/live/{domain}/fullchain.pem;
-    ssl_certificate_key /etc/letsencrypt/live/{domain}/privkey.pem;
+    ssl_certificate /etc/letsencrypt/live/{certificate_name}/fullchain.pem;
+    ssl_certificate_key /etc/letsencrypt/live/{certificate_name}/privkey.pem;
     
     ssl_protocols TLSv1.2 TLSv1.3;
     ssl_prefer_server_ciphers off;
@@ -128,8 +275,8 @@ server {{
         
         proxy_connect_timeout 60s;
         proxy_send_timeout 60s;
-        proxy_read_timeout 60s;
-    }}
+        proxy_read_timeout 60s;{cache_directives}
+    }}{static_locations}
 
     location ~ /\\.(?!well-known) {{
         deny all;
@@ -154,14 +301,380 @@ server {{
         
         proxy_connect_timeout 60s;
         proxy_send_timeout 60s;
-        proxy_read_timeout 60s;
-    }}
+        proxy_read_timeout 60s;{cache_directives}
+    }}{static_locations}
 
     location ~ /\\.(?!well-known) {{
         deny all;
     }}
 }}"""
 
+def generate_nginx_shared_config() -> str:
+    return f"""upstream halogen_www {{
+    server {config.WWW_UPSTREAM};
+    keepalive {config.WWW_UPSTREAM_KEEPALIVE};
+    keepalive_requests 1000;
+    keepalive_timeout 60s;
+}}
+
+map $http_upgrade $halogen_connection_upgrade {{
+    default upgrade;
+    ''      '';
+}}
+
+proxy_cache_path {config.NGINX_CACHE_DIR} levels=1:2 keys_zone={NGINX_CACHE_ZONE}:{config.NGINX_CACHE_KEYS_SIZE} max_size={config.NGINX_CACHE_MAX_SIZE} inactive={config.NGINX_CACHE_INACTIVE} use_temp_path=off;
+"""
+
+def generate_cache_directives(cache_enabled: bool) -> str:
+    if not cache_enabled:
+        return ""
+    
+    return f"""
+        
+        proxy_cache {NGINX_CACHE_ZONE};
+        proxy_cache_key $host$request_uri;
+        proxy_cache_valid 200 301 302 {config.NGINX_CACHE_TTL};
+        proxy_cache_valid 404 1m;
+        proxy_ignore_headers Cache-Control Expires;
+        proxy_cache_revalidate on;
+        proxy_cache_use_stale error timeout updating http_500 http_502 http_503 http_504;
+        proxy_cache_background_update on;
+        proxy_cache_lock on;
+        proxy_cache_lock_timeout 5s;
+        proxy_cache_bypass $cookie___prerender_bypass;
+        proxy_no_cache $http_upgrade $cookie___prerender_bypass;"""
+
+def generate_static_locations(static_build_dir: Optional[str], upstream: str, ssl_enabled: bool = False) -> str:
+    if not static_build_dir:
+        return ""
+    
+    brotli_static = "\n        brotli_static on;" if config.NGINX_BROTLI_STATIC else ""
+    
+    # add_header here stops the server-level headers from being inherited, so repeat them
+    if ssl_enabled:
+        security_headers = """
+        add_header Strict-Transport-Security "max-age=63072000" always;
+        add_header X-Frame-Options DENY;
+        add_header X-Content-Type-Options nosniff;
+        add_header X-XSS-Protection "1; mode=block";"""
+    else:
+        security_headers = """
+        add_header X-Content-Type-Options nosniff;"""
+    
+    # Chunks missing from the build dir (old and new builds overlapping during a release) go to the renderer
+    return f"""
+
+    location /_next/static/ {{
+        alias {static_build_dir.rstrip("/")}/static/;
+        try_files $uri @www_proxy;
+        
+        sendfile on;
+        tcp_nopush on;
+        open_file_cache max=10000 inactive=10m;
+        open_file_cache_valid 5m;
+        open_file_cache_min_uses 1;
+        open_file_cache_errors on;
+        
+        gzip_static on;{brotli_static}
+        
+        add_header Cache-Control "public, max-age=31536000, immutable";{security_headers}
+        access_log off;
+    }}
+
+    location @www_proxy {{
+        proxy_pass {upstream};
+        proxy_http_version 1.1;
+        proxy_set_header Connection "";
+        proxy_set_header Host $host;
+        proxy_set_header X-Real-IP $remote_addr;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto $scheme;
+    }}"""
+
+def generate_tuned_nginx_config(
+    domain: str,
+    project_id: str,
+    ssl_enabled: bool = False,
+    cache_enabled: bool = False,
+    static_build_dir: Optional[str] = None,
+    certificate_name: Optional[str] = None
+) -> str:
+    certificate_name = certificate_name or domain
+    cache_directives = generate_cache_directives(cache_enabled)
+    static_locations = generate_static_locations(static_build_dir, "http://halogen_www", ssl_enabled)
+    
+    proxy_location = f"""    gzip on;
+    gzip_vary on;
+    gzip_proxied any;
+    gzip_comp_level 5;
+    gzip_min_length 256;
+    gzip_types text/plain text/css text/xml text/javascript application/javascript application/json application/xml application/rss+xml image/svg+xml;
+
+    location / {{
+        proxy_pass http://halogen_www;
+        proxy_http_version 1.1;
+        proxy_set_header Upgrade $http_upgrade;
+        proxy_set_header Connection $halogen_connection_upgrade;
+        proxy_set_header Host $host;
+        proxy_set_header X-Real-IP $remote_addr;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto $scheme;
+        proxy_cache_bypass $http_upgrade;
+        
+        proxy_buffering on;
+        proxy_buffer_size 16k;
+        proxy_buffers 16 16k;
+        proxy_busy_buffers_size 32k;
+        
+        proxy_connect_timeout 60s;
+        proxy_send_timeout 60s;
+        proxy_read_timeout 60s;{cache_directives}
+    }}{static_locations}
+
+    location ~ /\\.(?!well-known) {{
+        deny all;
+    }}"""
+    
+    if ssl_enabled:
+        return f"""server {{
+    listen 80;
+    listen [::]:80;
+    server_name {domain};
+    return 301 https://$server_name$request_uri;
+}}
+
+server {{
+    listen 443 ssl http2;
+    listen [::]:443 ssl http2;
+    server_name {domain};
+
+    ssl_certificate /etc/letsencrypt/live/{certificate_name}/fullchain.pem;
+    ssl_certificate_key /etc/letsencrypt/live/{certificate_name}/privkey.pem;
+    ssl_trusted_certificate /etc/letsencrypt/live/{certificate_name}/chain.pem;
+    
+    ssl_protocols TLSv1.2 TLSv1.3;
+    ssl_prefer_server_ciphers off;
+    ssl_ciphers ECDHE-ECDSA-AES128-GCM-SHA256:ECDHE-RSA-AES128-GCM-SHA256:ECDHE-ECDSA-AES256-GCM-SHA384:ECDHE-RSA-AES256-GCM-SHA384;
+    
+    ssl_session_cache shared:HalogenSSL:20m;
+    ssl_session_timeout 1d;
+    ssl_session_tickets on;
+    
+    ssl_stapling on;
+    ssl_stapling_verify on;
+    resolver {config.NGINX_RESOLVER} valid=300s;
+    resolver_timeout 5s;
+    
+    add_header Strict-Transport-Security "max-age=63072000" always;
+    add_header X-Frame-Options DENY;
+    add_header X-Content-Type-Options nosniff;
+    add_header X-XSS-Protection "1; mode=block";
+
+{proxy_location}
+}}"""
+    else:
+        return f"""server {{
+    listen 80;
+    listen [::]:80;
+    server_name {domain};
+
+{proxy_location}
+}}"""
+
+def site_metadata_path(domain: str) -> Path:
+    return Path(NGINX_CONFIG_DIR) / f"{domain}.json"
+
+def read_site_metadata(domain: str) -> Optional[dict]:
+    metadata_path = site_metadata_path(domain)
+    if metadata_path.exists():
+        try:
+            return json.loads(metadata_path.read_text())
+        except ValueError as e:
+            logger.warning(f"Ignoring unreadable site metadata for {domain}: {e}")
+    
+    local_config_path = Path(NGINX_CONFIG_DIR) / f"{domain}.conf"
+    if not local_config_path.exists():
+        return None
+    
+    # Sites deployed before metadata was recorded: recognise our own generated output
+    content = local_config_path.read_text()
+    ssl_enabled = "ssl_certificate" in content
+    certificate_name = domain if ssl_enabled else None
+    for profile in NGINX_PROFILES:
+        if content == generate_nginx_config(domain, "", ssl_enabled, profile, certificate_name=certificate_name):
+            return {"domain": domain, "project_id": None, "ssl_enabled": ssl_enabled, "profile": profile, "cache_enabled": False, "static_build_dir": None, "certificate_name": certificate_name, "custom": False}
+    
+    return {"domain": domain, "project_id": None, "ssl_enabled": ssl_enabled, "profile": None, "cache_enabled": False, "static_build_dir": None, "certificate_name": certificate_name, "custom": True}
+
+def write_site_metadata(domain: str, metadata: dict) -> None:
+    site_metadata_path(domain).write_text(json.dumps(metadata, indent=2))
+
+async def install_shared_nginx_config() -> None:
+    local_shared_path = Path(NGINX_TEMPLATES_DIR) / NGINX_SHARED_CONFIG_NAME
+    shared_content = generate_nginx_shared_config()
+    
+    if local_shared_path.exists() and local_shared_path.read_text() == shared_content and (Path(NGINX_CONF_D) / NGINX_SHARED_CONFIG_NAME).exists():
+        return
+    
+    local_shared_path.write_text(shared_content)
+    await run_command(["sudo", "cp", str(local_shared_path), str(Path(NGINX_CONF_D) / NGINX_SHARED_CONFIG_NAME)])
+    logger.info(f"Shared nginx config installed to {NGINX_CONF_D}")
+
+def purge_cache_entries(domain: str, path_prefix: Optional[str] = None) -> int:
+    # Cache files start with a binary header followed by a "KEY: <proxy_cache_key>" line
+    key_prefix = f"{domain}{path_prefix or '/'}".encode()
+    purged = 0
+    
+    for root, _, files in os.walk(config.NGINX_CACHE_DIR):
+        for name in files:
+            cache_file = Path(root) / name
+            try:
+                with cache_file.open("rb") as f:
+                    head = f.read(4096)
+            except OSError:
+                continue
+            
+            key_start = head.find(b"\nKEY: ")
+            if key_start == -1:
+                continue
+            key_end = head.find(b"\n", key_start + 6)
+            key = head[key_start + 6:key_end if key_end != -1 else None]
+            
+            if key.startswith(key_prefix):
+                try:
+                    cache_file.unlink()
+                    purged += 1
+                except FileNotFoundError:
+                    pass
+    
+    return purged
+
+def generate_site_config(domain: str, metadata: dict) -> str:
+    return generate_nginx_config(
+        domain,
+        metadata.get("project_id") or "",
+        metadata["ssl_enabled"],
+        metadata.get("profile") or "default",
+        metadata.get("cache_enabled", False),
+        metadata.get("static_build_dir"),
+        metadata.get("certificate_name")
+    )
+
+def read_current_static_build_dir() -> Optional[str]:
+    release_path = Path(NGINX_TEMPLATES_DIR) / STATIC_RELEASE_FILE_NAME
+    if release_path.exists():
+        try:
+            return json.loads(release_path.read_text())["build_dir"]
+        except (ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable static release file: {e}")
+    return config.WWW_BUILD_DIR or None
+
+def write_current_static_build_dir(build_dir: str) -> None:
+    release_path = Path(NGINX_TEMPLATES_DIR) / STATIC_RELEASE_FILE_NAME
+    release_path.write_text(json.dumps({
+        "build_dir": build_dir,
+        "released_at": datetime.now().isoformat()
+    }, indent=2))
+
+async def test_and_reload_nginx(domains: List[str]) -> None:
+    try:
+        try:
+            await run_command(["sudo", "nginx", "-t"])
+        except subprocess.CalledProcessError:
+            site_state.nginx_test_passed = False
+            raise
+        site_state.nginx_test_passed = True
+        await run_command(["sudo", "systemctl", "reload", "nginx"])
+    except subprocess.CalledProcessError as e:
+        event_bus.publish(events.NGINX_RELOAD_FAILED, {
+            "domains": domains,
+            "error": e.stderr.decode().strip() if e.stderr else str(e)
+        })
+        raise
+    
+    event_bus.publish(events.NGINX_RELOAD_COMPLETED, {"domains": domains})
+
+def publish_config_deployed(domain: str, metadata: dict) -> None:
+    event_bus.publish(events.NGINX_CONFIG_DEPLOYED, dict(metadata, domain=domain))
+
+async def regenerate_site_configs(
+    domains: Optional[List[str]],
+    changes: dict,
+    skip_reason: Optional[Callable[[dict], Optional[str]]] = None
+) -> Tuple[List[str], List[dict]]:
+    if domains is not None:
+        domains = [domain.lower().strip() for domain in domains]
+    else:
+        domains = sorted(
+            domain for domain, state in site_state.sites.items() if state["local_config_exists"]
+        )
+    
+    previous_configs: Dict[str, str] = {}
+    updated_metadata: Dict[str, dict] = {}
+    skipped = []
+    
+    for domain in domains:
+        metadata = read_site_metadata(domain)
+        if metadata is None:
+            skipped.append({"domain": domain, "reason": "No local config found"})
+            continue
+        if metadata.get("custom"):
+            skipped.append({"domain": domain, "reason": "Custom config content"})
+            continue
+        reason = skip_reason(metadata) if skip_reason else None
+        if reason:
+            skipped.append({"domain": domain, "reason": reason})
+            continue
+        if all(metadata.get(key) == value for key, value in changes.items()):
+            skipped.append({"domain": domain, "reason": "Already up to date"})
+            continue
+        
+        updated_metadata[domain] = {**metadata, **changes}
+    
+    if not updated_metadata:
+        return [], skipped
+    
+    try:
+        for domain, metadata in updated_metadata.items():
+            local_config_path = Path(NGINX_CONFIG_DIR) / f"{domain}.conf"
+            previous_configs[domain] = local_config_path.read_text()
+            await install_site_config(domain, generate_site_config(domain, metadata))
+        
+        await test_and_reload_nginx(list(updated_metadata.keys()))
+    except Exception:
+        logger.error(f"Regenerating site configs with {changes} failed, restoring previous configs")
+        for domain, previous_content in previous_configs.items():
+            try:
+                await install_site_config(domain, previous_content)
+            except Exception as e:
+                logger.error(f"Could not restore nginx config for {domain}: {e}")
+        # The restored configs have not been tested yet
+        site_state.nginx_test_passed = None
+        raise
+    
+    for domain, metadata in updated_metadata.items():
+        write_site_metadata(domain, metadata)
+        site_state.refresh(domain)
+        publish_config_deployed(domain, metadata)
+    
+    return list(updated_metadata.keys()), skipped
+
+async def install_site_config(domain: str, config_content: str) -> Path:
+    local_config_path = Path(NGINX_CONFIG_DIR) / f"{domain}.conf"
+    sites_available_path = Path(NGINX_SITES_AVAILABLE) / domain
+    sites_enabled_path = Path(NGINX_SITES_ENABLED) / domain
+    
+    local_config_path.write_text(config_content)
+    logger.info(f"Nginx config written to {local_config_path}")
+    
+    await run_command(["sudo", "cp", str(local_config_path), str(sites_available_path)])
+    
+    if sites_enabled_path.exists():
+        await run_command(["sudo", "rm", str(sites_enabled_path)])
+    await run_command(["sudo", "ln", "-s", str(sites_available_path), str(sites_enabled_path)])
+    
+    return local_config_path
+
 @app.get("/health")
 async def health_check():
     try:
@@ -181,6 +694,9 @@ async def health_check():
             data={
                 "status": "healthy",
                 "dependencies": dependencies,
+                "site_state": site_state.summary(),
+                "idempotency": idempotency_cache.stats(),
+                "events": event_bus.stats(),
                 "timestamp": datetime.now().isoformat()
             }
         )
@@ -188,6 +704,44 @@ async def health_check():
         logger.error(f"Health check failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/events")
+async def stream_events(request: Request, since: Optional[str] = None) -> StreamingResponse:
+    epoch, after_seq = None, None
+    if since is not None:
+        try:
+            epoch, after_seq = parse_event_id(since)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    elif request.headers.get("last-event-id"):
+        try:
+            epoch, after_seq = parse_event_id(request.headers["last-event-id"])
+        except ValueError:
+            logger.warning(f"Ignoring invalid Last-Event-ID: {request.headers['last-event-id']}")
+    
+    async def event_stream():
+        yield f"retry: {config.EVENTS_RETRY_MS}\n\n"
+        async for event in event_bus.subscribe(after_seq, epoch, keepalive=config.EVENTS_KEEPALIVE_SECONDS):
+            if await request.is_disconnected():
+                break
+            yield format_sse(event)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+@app.get("/idempotency/stats")
+async def get_idempotency_stats() -> ApiResponse:
+    return ApiResponse(
+        success=True,
+        message="Idempotency cache stats retrieved",
+        data=idempotency_cache.stats()
+    )
+
 async def check_command_available(command: str) -> bool:
     try:
         await run_command([command, "--version"], check=False)
@@ -206,26 +760,37 @@ async def deploy_nginx_config(request: NginxConfigRequest) -> ApiResponse:
         
         config.ensure_directories()
         
-        config_content = request.config_content or generate_nginx_config(
-            domain, project_id, request.ssl_enabled
-        )
-        
-        local_config_path = Path(NGINX_CONFIG_DIR) / f"{domain}.conf"
-        sites_available_path = Path(NGINX_SITES_AVAILABLE) / domain
-        sites_enabled_path = Path(NGINX_SITES_ENABLED) / domain
+        profile = request.profile or config.NGINX_DEFAULT_PROFILE
+        if profile not in NGINX_PROFILES:
+            raise HTTPException(status_code=400, detail=f"Unknown nginx profile: {profile}")
         
-        local_config_path.write_text(config_content)
-        logger.info(f"Nginx config written to {local_config_path}")
+        static_build_dir = None
+        if request.static_enabled and not request.config_content:
+            static_build_dir = read_current_static_build_dir()
+            if not static_build_dir:
+                raise HTTPException(status_code=400, detail="Static assets requested but no build directory is configured")
         
-        await run_command(["sudo", "cp", str(local_config_path), str(sites_available_path)])
+        if not request.config_content and (profile == "tuned" or request.cache_enabled):
+            await install_shared_nginx_config()
         
-        if sites_enabled_path.exists():
-            await run_command(["sudo", "rm", str(sites_enabled_path)])
-        await run_command(["sudo", "ln", "-s", str(sites_available_path), str(sites_enabled_path)])
+        metadata = {
+            "domain": domain,
+            "project_id": project_id,
+            "ssl_enabled": request.ssl_enabled,
+            "profile": None if request.config_content else profile,
+            "cache_enabled": request.cache_enabled,
+            "static_build_dir": static_build_dir,
+            "certificate_name": certificate_name_for(domain) if request.ssl_enabled else None,
+            "custom": bool(request.config_content)
+        }
+        config_content = request.config_content or generate_site_config(domain, metadata)
         
-        await run_command(["sudo", "nginx", "-t"])
+        local_config_path = await install_site_config(domain, config_content)
+        write_site_metadata(domain, metadata)
         
-        await run_command(["sudo", "systemctl", "reload", "nginx"])
+        await test_and_reload_nginx([domain])
+        site_state.refresh(domain)
+        publish_config_deployed(domain, metadata)
         
         return ApiResponse(
             success=True,
@@ -234,10 +799,15 @@ async def deploy_nginx_config(request: NginxConfigRequest) -> ApiResponse:
                 "domain": domain,
                 "project_id": project_id,
                 "ssl_enabled": request.ssl_enabled,
+                "profile": None if request.config_content else profile,
+                "cache_enabled": request.cache_enabled,
+                "static_build_dir": static_build_dir,
                 "config_path": str(local_config_path)
             }
         )
     
+    except HTTPException:
+        raise
     except subprocess.CalledProcessError as e:
         error_msg = f"Command failed: {e.stderr or e.stdout or str(e)}"
         logger.error(error_msg)
@@ -254,6 +824,7 @@ async def remove_nginx_config(request: DomainRequest) -> ApiResponse:
         sites_enabled_path = Path(NGINX_SITES_ENABLED) / domain
         sites_available_path = Path(NGINX_SITES_AVAILABLE) / domain
         local_config_path = Path(NGINX_CONFIG_DIR) / f"{domain}.conf"
+        metadata_path = site_metadata_path(domain)
         
         if sites_enabled_path.exists():
             await run_command(["sudo", "rm", str(sites_enabled_path)])
@@ -264,8 +835,13 @@ async def remove_nginx_config(request: DomainRequest) -> ApiResponse:
         if local_config_path.exists():
             local_config_path.unlink()
         
-        await run_command(["sudo", "nginx", "-t"])
-        await run_command(["sudo", "systemctl", "reload", "nginx"])
+        if metadata_path.exists():
+            metadata_path.unlink()
+        
+        site_state.refresh(domain)
+        event_bus.publish(events.NGINX_CONFIG_REMOVED, {"domain": domain})
+        
+        await test_and_reload_nginx([domain])
         
         return ApiResponse(
             success=True,
@@ -281,29 +857,93 @@ async def remove_nginx_config(request: DomainRequest) -> ApiResponse:
         logger.error(f"Error removing nginx config: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/nginx/profile")
+async def switch_nginx_profile(request: NginxProfileSwitchRequest) -> ApiResponse:
+    try:
+        config.ensure_directories()
+        
+        await install_shared_nginx_config()
+        
+        switched, skipped = await regenerate_site_configs(request.domains, {"profile": request.profile})
+        
+        return ApiResponse(
+            success=True,
+            message=f"Switched {len(switched)} site(s) to the {request.profile} nginx profile",
+            data={
+                "profile": request.profile,
+                "switched": switched,
+                "skipped": skipped
+            }
+        )
+    
+    except subprocess.CalledProcessError as e:
+        error_msg = f"Command failed: {e.stderr or e.stdout or str(e)}"
+        logger.error(error_msg)
+        raise HTTPException(status_code=500, detail=error_msg)
+    except Exception as e:
+        logger.error(f"Error switching nginx profile: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/nginx/static-release")
+async def release_static_build(request: StaticReleaseRequest) -> ApiResponse:
+    try:
+        build_dir = request.build_dir.rstrip("/")
+        
+        if not Path(build_dir, "static").is_dir():
+            raise HTTPException(status_code=400, detail=f"No static directory found in {build_dir}")
+        
+        config.ensure_directories()
+        
+        switched, skipped = await regenerate_site_configs(
+            request.domains,
+            {"static_build_dir": build_dir},
+            lambda metadata: None if metadata.get("static_build_dir") else "Static asset serving not enabled"
+        )
+        write_current_static_build_dir(build_dir)
+        
+        return ApiResponse(
+            success=True,
+            message=f"Pointed {len(switched)} site(s) at static build {build_dir}",
+            data={
+                "build_dir": build_dir,
+                "switched": switched,
+                "skipped": skipped
+            }
+        )
+    
+    except HTTPException:
+        raise
+    except subprocess.CalledProcessError as e:
+        error_msg = f"Command failed: {e.stderr or e.stdout or str(e)}"
+        logger.error(error_msg)
+        raise HTTPException(status_code=500, detail=error_msg)
+    except Exception as e:
+        logger.error(f"Error releasing static build: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/nginx/status/{domain}")
 async def get_nginx_status(domain: str) -> ApiResponse:
     try:
         domain = domain.lower().strip()
         
-        sites_available_path = Path(NGINX_SITES_AVAILABLE) / domain
-        sites_enabled_path = Path(NGINX_SITES_ENABLED) / domain
-        local_config_path = Path(NGINX_CONFIG_DIR) / f"{domain}.conf"
+        state = site_state.get(domain)
+        
+        if site_state.nginx_test_passed is None:
+            try:
+                await run_command(["sudo", "nginx", "-t"], check=True)
+                site_state.nginx_test_passed = True
+            except subprocess.CalledProcessError:
+                site_state.nginx_test_passed = False
         
         status = {
             "domain": domain,
-            "sites_available_exists": sites_available_path.exists(),
-            "sites_enabled_exists": sites_enabled_path.exists(),
-            "local_config_exists": local_config_path.exists(),
-            "nginx_test_passed": False
+            "sites_available_exists": state["sites_available_exists"],
+            "sites_enabled_exists": state["sites_enabled_exists"],
+            "sites_enabled_is_symlink": state["sites_enabled_is_symlink"],
+            "local_config_exists": state["local_config_exists"],
+            "nginx_test_passed": site_state.nginx_test_passed
         }
         
-        try:
-            await run_command(["sudo", "nginx", "-t"], check=True)
-            status["nginx_test_passed"] = True
-        except subprocess.CalledProcessError:
-            status["nginx_test_passed"] = False
-        
         return ApiResponse(
             success=True,
             message=f"Nginx status retrieved for {domain}",
@@ -314,6 +954,36 @@ async def get_nginx_status(domain: str) -> ApiResponse:
         logger.error(f"Error getting nginx status: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/cache/purge")
+async def purge_cache(request: CachePurgeRequest) -> ApiResponse:
+    try:
+        domain = request.domain.lower().strip()
+        path = request.path
+        
+        if not domain:
+            raise HTTPException(status_code=400, detail="Domain is required")
+        if path is not None and not path.startswith("/"):
+            raise HTTPException(status_code=400, detail="Path must start with /")
+        
+        purged = await asyncio.to_thread(purge_cache_entries, domain, path)
+        logger.info(f"Purged {purged} cache entries for {domain}{path or ''}")
+        
+        return ApiResponse(
+            success=True,
+            message=f"Cache purged for {domain}{path or ''}",
+            data={
+                "domain": domain,
+                "path": path,
+                "purged": purged
+            }
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error purging cache: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/ssl/generate")
 async def generate_ssl_certificate(request: SSLCertificateRequest) -> ApiResponse:
     try:
@@ -322,6 +992,19 @@ async def generate_ssl_certificate(request: SSLCertificateRequest) -> ApiRespons
         
         config.ensure_directories()
         
+        if certificate_name_for(domain) == config.WILDCARD_CERT_NAME:
+            return ApiResponse(
+                success=True,
+                message=f"{domain} is covered by the platform wildcard certificate",
+                data={
+                    "domain": domain,
+                    "certificate_name": config.WILDCARD_CERT_NAME,
+                    "certificate_path": str(Path(CERTBOT_LIVE_DIR) / config.WILDCARD_CERT_NAME / "fullchain.pem"),
+                    "already_exists": True,
+                    "wildcard": True
+                }
+            )
+        
         cert_path = Path(CERTBOT_LIVE_DIR) / domain / "fullchain.pem"
         
         if cert_path.exists() and not request.force_renewal:
@@ -342,13 +1025,15 @@ async def generate_ssl_certificate(request: SSLCertificateRequest) -> ApiRespons
             "-d", domain,
             "--email", email,
             "--agree-tos",
-            "--non-interactive"
+            "--non-interactive",
+            *acme_server_args()
         ]
         
         if request.force_renewal:
             certbot_command.append("--force-renewal")
         
         result = await run_command(certbot_command)
+        site_state.refresh(domain)
         
         if not cert_path.exists():
             raise HTTPException(
@@ -378,18 +1063,21 @@ async def generate_ssl_certificate(request: SSLCertificateRequest) -> ApiRespons
 async def renew_ssl_certificate(request: DomainRequest) -> ApiResponse:
     try:
         domain = request.domain.lower().strip()
+        certificate_name = certificate_name_for(domain)
         
         result = await run_command([
             "sudo", "certbot", "renew",
-            "--cert-name", domain,
+            "--cert-name", certificate_name,
             "--non-interactive"
         ])
+        site_state.refresh(certificate_name)
         
         return ApiResponse(
             success=True,
             message=f"SSL certificate renewal initiated for {domain}",
             data={
                 "domain": domain,
+                "certificate_name": certificate_name,
                 "command_output": result.stdout
             }
         )
@@ -406,25 +1094,32 @@ async def renew_ssl_certificate(request: DomainRequest) -> ApiResponse:
 async def get_ssl_status(domain: str) -> ApiResponse:
     try:
         domain = domain.lower().strip()
+        certificate_name = certificate_name_for(domain)
         
-        cert_path = Path(CERTBOT_LIVE_DIR) / domain / "fullchain.pem"
-        key_path = Path(CERTBOT_LIVE_DIR) / domain / "privkey.pem"
+        state = site_state.get(certificate_name)
+        not_before = state["certificate_not_before"]
+        not_after = state["certificate_not_after"]
         
         status = {
             "domain": domain,
-            "certificate_exists": cert_path.exists(),
-            "private_key_exists": key_path.exists(),
-            "certificate_info": None
+            "certificate_name": certificate_name,
+            "certificate_exists": state["certificate_exists"],
+            "private_key_exists": state["private_key_exists"],
+            "certificate_info": None,
+            "expiry_date": None,
+            "is_valid": False
         }
         
-        if cert_path.exists():
-            try:
-                result = await run_command([
-                    "sudo", "openssl", "x509", "-in", str(cert_path), "-noout", "-dates"
-                ])
-                status["certificate_info"] = result.stdout.strip()
-            except subprocess.CalledProcessError as e:
-                status["certificate_info"] = f"Error reading certificate: {e.stderr}"
+        if not_before and not_after:
+            now = datetime.now(timezone.utc)
+            status["certificate_info"] = (
+                f"notBefore={format_openssl_date(not_before)}\n"
+                f"notAfter={format_openssl_date(not_after)}"
+            )
+            status["expiry_date"] = not_after.isoformat()
+            status["is_valid"] = state["private_key_exists"] and not_before <= now < not_after
+        elif state["certificate_exists"]:
+            status["certificate_info"] = "Error reading certificate"
         
         return ApiResponse(
             success=True,
@@ -436,16 +1131,162 @@ async def get_ssl_status(domain: str) -> ApiResponse:
         logger.error(f"Error getting SSL status: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def delete_migrated_certificates() -> Tuple[List[str], List[dict]]:
+    deleted, failed = [], []
+    
+    for domain, state in sorted(site_state.sites.items()):
+        if not is_platform_subdomain(domain) or not state["certificate_exists"]:
+            continue
+        
+        # Only lineages no config refers to any more: the site must already be on the wildcard
+        metadata = read_site_metadata(domain)
+        if not metadata or metadata.get("certificate_name") != config.WILDCARD_CERT_NAME:
+            continue
+        
+        try:
+            await run_command(["sudo", "certbot", "delete", "--cert-name", domain, "--non-interactive"])
+            deleted.append(domain)
+        except subprocess.CalledProcessError as e:
+            failed.append({"domain": domain, "error": e.stderr.decode().strip() if e.stderr else str(e)})
+        site_state.refresh(domain)
+    
+    return deleted, failed
+
+@app.post("/ssl/wildcard/generate")
+async def generate_wildcard_certificate(request: WildcardCertificateRequest) -> ApiResponse:
+    try:
+        if config.DNS_PROVIDER not in DNS_PROVIDERS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"DNS_PROVIDER must be one of {', '.join(DNS_PROVIDERS)} for DNS-01 issuance"
+            )
+        
+        platform_domain = config.PLATFORM_DOMAIN
+        certificate_name = config.WILDCARD_CERT_NAME
+        cert_path = Path(CERTBOT_LIVE_DIR) / certificate_name / "fullchain.pem"
+        result = None
+        
+        if not site_state.get(certificate_name)["certificate_exists"] or request.force_renewal:
+            certbot_command = [
+                "sudo", "certbot", "certonly",
+                "--manual",
+                "--preferred-challenges", "dns",
+                "--manual-auth-hook", certbot_hook_command("auth"),
+                "--manual-cleanup-hook", certbot_hook_command("cleanup"),
+                "-d", platform_domain,
+                "-d", f"*.{platform_domain}",
+                "--cert-name", certificate_name,
+                "--email", request.email or config.DEFAULT_EMAIL,
+                "--agree-tos",
+                "--non-interactive",
+                *acme_server_args()
+            ]
+            
+            if request.force_renewal:
+                certbot_command.append("--force-renewal")
+            
+            result = await run_command(certbot_command)
+            site_state.refresh(certificate_name)
+            
+            if not site_state.get(certificate_name)["certificate_exists"]:
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Certificate generation completed but certificate file not found at {cert_path}"
+                )
+        
+        migrated, skipped = [], []
+        if request.migrate_sites:
+            migrated, skipped = await regenerate_site_configs(
+                [domain for domain in site_state.sites if is_platform_subdomain(domain)],
+                {"certificate_name": certificate_name},
+                lambda metadata: None if metadata["ssl_enabled"] else "SSL not enabled"
+            )
+        
+        # certbot keeps renewing the old per-domain lineages until they are deleted
+        deleted_certificates, failed_deletions = [], []
+        if request.delete_migrated_certs:
+            deleted_certificates, failed_deletions = await delete_migrated_certificates()
+        
+        return ApiResponse(
+            success=True,
+            message=f"Wildcard SSL certificate ready for *.{platform_domain}",
+            data={
+                "certificate_name": certificate_name,
+                "certificate_path": str(cert_path),
+                "already_exists": result is None,
+                "migrated": migrated,
+                "skipped": skipped,
+                "deleted_certificates": deleted_certificates,
+                "failed_deletions": failed_deletions,
+                "command_output": result.stdout if result else None
+            }
+        )
+    
+    except HTTPException:
+        raise
+    except subprocess.CalledProcessError as e:
+        error_msg = f"Certbot failed: {e.stderr or e.stdout or str(e)}"
+        logger.error(error_msg)
+        raise HTTPException(status_code=500, detail=error_msg)
+    except Exception as e:
+        logger.error(f"Error generating wildcard SSL certificate: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/ssl/wildcard/renew")
+async def renew_wildcard_certificate() -> ApiResponse:
+    try:
+        certificate_name = config.WILDCARD_CERT_NAME
+        
+        # The DNS hooks were stored in certbot's renewal config when the certificate was issued
+        result = await run_command([
+            "sudo", "certbot", "renew",
+            "--cert-name", certificate_name,
+            "--non-interactive"
+        ])
+        site_state.refresh(certificate_name)
+        
+        return ApiResponse(
+            success=True,
+            message=f"Wildcard SSL certificate renewal initiated for *.{config.PLATFORM_DOMAIN}",
+            data={
+                "certificate_name": certificate_name,
+                "command_output": result.stdout
+            }
+        )
+    
+    except subprocess.CalledProcessError as e:
+        error_msg = f"Certificate renewal failed: {e.stderr or e.stdout or str(e)}"
+        logger.error(error_msg)
+        raise HTTPException(status_code=500, detail=error_msg)
+    except Exception as e:
+        logger.error(f"Error renewing wildcard SSL certificate: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/ssl/wildcard/status")
+async def get_wildcard_status() -> ApiResponse:
+    return await get_ssl_status(config.WILDCARD_CERT_NAME)
+
 @app.post("/ssl/remove")
 async def remove_ssl_certificate(request: DomainRequest) -> ApiResponse:
     try:
         domain = request.domain.lower().strip()
         
+        if certificate_name_for(domain) == config.WILDCARD_CERT_NAME and not site_state.get(domain)["certificate_exists"]:
+            return ApiResponse(
+                success=True,
+                message=f"{domain} uses the platform wildcard certificate, nothing to remove",
+                data={
+                    "domain": domain,
+                    "certificate_name": config.WILDCARD_CERT_NAME
+                }
+            )
+        
         result = await run_command([
             "sudo", "certbot", "delete",
             "--cert-name", domain,
             "--non-interactive"
         ])
+        site_state.refresh(domain)
         
         return ApiResponse(
             success=True,
@@ -484,7 +1325,10 @@ async def setup_domain(request: DomainSetupRequest) -> ApiResponse:
         nginx_request = NginxConfigRequest(
             domain=domain,
             project_id=project_id,
-            ssl_enabled=False
+            ssl_enabled=False,
+            profile=request.profile,
+            cache_enabled=request.cache_enabled,
+            static_enabled=request.static_enabled
         )
         
         nginx_response = await deploy_nginx_config(nginx_request)
@@ -505,7 +1349,10 @@ async def setup_domain(request: DomainSetupRequest) -> ApiResponse:
                 nginx_ssl_request = NginxConfigRequest(
                     domain=domain,
                     project_id=project_id,
-                    ssl_enabled=True
+                    ssl_enabled=True,
+                    profile=request.profile,
+                    cache_enabled=request.cache_enabled,
+                    static_enabled=request.static_enabled
                 )
                 
                 nginx_ssl_response = await deploy_nginx_config(nginx_ssl_request)
@@ -549,7 +1396,10 @@ async def complete_domain_setup(request: DomainSetupRequest) -> ApiResponse:
         nginx_request = NginxConfigRequest(
             domain=domain,
             project_id=project_id,
-            ssl_enabled=False
+            ssl_enabled=False,
+            profile=request.profile,
+            cache_enabled=request.cache_enabled,
+            static_enabled=request.static_enabled
         )
         
         nginx_response = await deploy_nginx_config(nginx_request)
@@ -574,7 +1424,10 @@ async def complete_domain_setup(request: DomainSetupRequest) -> ApiResponse:
                 nginx_ssl_request = NginxConfigRequest(
                     domain=domain,
                     project_id=project_id,
-                    ssl_enabled=True
+                    ssl_enabled=True,
+                    profile=request.profile,
+                    cache_enabled=request.cache_enabled,
+                    static_enabled=request.static_enabled
                 )
                 
                 nginx_ssl_response = await deploy_nginx_config(nginx_ssl_request)
@@ -0,0 +1,326 @@
+import asyncio
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from cryptography import x509
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+    inotify_flags = None
+
+logger = logging.getLogger(__name__)
+
+
+def format_openssl_date(value: datetime) -> str:
+    return f"{value:%b} {value.day:>2} {value:%H:%M:%S %Y} GMT"
+
+
+class SiteStateWatcher:
+    """In-memory view of the nginx site files and certbot certificates per domain.
+
+    inotify keeps the map current when files change outside the API (certbot's
+    renewal timer, an operator editing configs); a periodic full rescan covers
+    queue overflows and hosts where inotify is unavailable.
+    """
+
+    def __init__(
+        self,
+        sites_available: str,
+        sites_enabled: str,
+        config_dir: str,
+        certbot_live_dir: str,
+        rescan_interval: int = 300
+    ):
+        self.sites_available = Path(sites_available)
+        self.sites_enabled = Path(sites_enabled)
+        self.config_dir = Path(config_dir)
+        self.certbot_live_dir = Path(certbot_live_dir)
+        self.rescan_interval = rescan_interval
+
+        self.sites: Dict[str, dict] = {}
+        self.nginx_test_passed: Optional[bool] = None
+        self.last_rescan: Optional[datetime] = None
+
+        self._listeners: List[Callable[[str, dict, dict], None]] = []
+        self._inotify = None
+        self._watches: Dict[int, Path] = {}
+        self._watched_paths: Dict[Path, int] = {}
+        self._rescan_task: Optional[asyncio.Task] = None
+
+    @property
+    def inotify_enabled(self) -> bool:
+        return self._inotify is not None
+
+    async def start(self) -> None:
+        if INotify is None:
+            logger.warning("inotify_simple not installed, site state relies on periodic rescans only")
+        else:
+            try:
+                self._inotify = INotify()
+                asyncio.get_running_loop().add_reader(self._inotify.fileno(), self._read_events)
+            except OSError as e:
+                logger.warning(f"inotify unavailable, site state relies on periodic rescans only: {e}")
+                self._close_inotify()
+
+        self.rescan()
+        self._rescan_task = asyncio.create_task(self._rescan_loop())
+        logger.info(f"Site state watcher started with {len(self.sites)} domains (inotify: {self.inotify_enabled})")
+
+    async def stop(self) -> None:
+        if self._rescan_task:
+            self._rescan_task.cancel()
+            try:
+                await self._rescan_task
+            except asyncio.CancelledError:
+                pass
+            self._rescan_task = None
+
+        self._close_inotify()
+
+    def add_listener(self, listener: Callable[[str, dict, dict], None]) -> None:
+        """Register ``listener(domain, previous_state, current_state)``, called whenever a domain's state changes."""
+        self._listeners.append(listener)
+
+    def get(self, domain: str) -> dict:
+        state = self.sites.get(domain)
+        if state is None:
+            return self._empty_state(domain)
+        return dict(state)
+
+    def refresh(self, domain: str) -> dict:
+        previous = self.get(domain)
+        state = self._scan_domain(domain)
+        if self._is_present(state):
+            self.sites[domain] = state
+        else:
+            self.sites.pop(domain, None)
+
+        self._notify(domain, previous, state)
+
+        if self.inotify_enabled:
+            self._watch_certificate_dir(domain)
+
+        return dict(state)
+
+    def rescan(self) -> None:
+        domains = set()
+
+        for directory in (self.sites_available, self.sites_enabled):
+            domains.update(self._list_names(directory))
+
+        domains.update(
+            name[:-len(".conf")] for name in self._list_names(self.config_dir) if name.endswith(".conf")
+        )
+        domains.update(
+            name for name in self._list_names(self.certbot_live_dir)
+            if (self.certbot_live_dir / name).is_dir()
+        )
+
+        sites = {}
+        for domain in domains:
+            state = self._scan_domain(domain)
+            if self._is_present(state):
+                sites[domain] = state
+
+        previous_sites = self.sites
+        initial_scan = self.last_rescan is None
+
+        self.sites = sites
+        self.nginx_test_passed = None
+        self.last_rescan = datetime.now()
+
+        if not initial_scan:
+            for domain in set(previous_sites) | set(sites):
+                self._notify(
+                    domain,
+                    previous_sites.get(domain) or self._empty_state(domain),
+                    sites.get(domain) or self._empty_state(domain)
+                )
+
+        if self.inotify_enabled:
+            self._add_watches()
+
+    def summary(self) -> dict:
+        return {
+            "domains": len(self.sites),
+            "inotify_enabled": self.inotify_enabled,
+            "rescan_interval": self.rescan_interval,
+            "last_rescan": self.last_rescan.isoformat() if self.last_rescan else None
+        }
+
+    def _notify(self, domain: str, previous: dict, current: dict) -> None:
+        if previous == current:
+            return
+        for listener in self._listeners:
+            try:
+                listener(domain, previous, current)
+            except Exception as e:
+                logger.error(f"Site state listener failed for {domain}: {e}")
+
+    def _empty_state(self, domain: str) -> dict:
+        return {
+            "domain": domain,
+            "sites_available_exists": False,
+            "sites_enabled_exists": False,
+            "sites_enabled_is_symlink": False,
+            "local_config_exists": False,
+            "certificate_exists": False,
+            "private_key_exists": False,
+            "certificate_not_before": None,
+            "certificate_not_after": None
+        }
+
+    def _is_present(self, state: dict) -> bool:
+        return any(
+            state[key] for key in (
+                "sites_available_exists",
+                "sites_enabled_is_symlink",
+                "sites_enabled_exists",
+                "local_config_exists",
+                "certificate_exists",
+                "private_key_exists"
+            )
+        )
+
+    def _scan_domain(self, domain: str) -> dict:
+        state = self._empty_state(domain)
+
+        sites_enabled_path = self.sites_enabled / domain
+        cert_path = self.certbot_live_dir / domain / "fullchain.pem"
+        key_path = self.certbot_live_dir / domain / "privkey.pem"
+
+        state["sites_available_exists"] = (self.sites_available / domain).exists()
+        state["sites_enabled_exists"] = sites_enabled_path.exists()
+        state["sites_enabled_is_symlink"] = sites_enabled_path.is_symlink()
+        state["local_config_exists"] = (self.config_dir / f"{domain}.conf").exists()
+        state["certificate_exists"] = cert_path.exists()
+        state["private_key_exists"] = key_path.exists()
+
+        if state["certificate_exists"]:
+            try:
+                certificate = x509.load_pem_x509_certificate(cert_path.read_bytes())
+                state["certificate_not_before"] = certificate.not_valid_before_utc
+                state["certificate_not_after"] = certificate.not_valid_after_utc
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read certificate for {domain}: {e}")
+
+        return state
+
+    def _list_names(self, directory: Path) -> List[str]:
+        try:
+            return [entry.name for entry in directory.iterdir()]
+        except OSError:
+            return []
+
+    async def _rescan_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.rescan_interval)
+            try:
+                self.rescan()
+            except Exception as e:
+                logger.error(f"Site state rescan failed: {e}")
+
+    def _add_watches(self) -> None:
+        mask = (
+            inotify_flags.CREATE | inotify_flags.DELETE | inotify_flags.MOVED_FROM |
+            inotify_flags.MOVED_TO | inotify_flags.CLOSE_WRITE | inotify_flags.ATTRIB |
+            inotify_flags.DELETE_SELF | inotify_flags.MOVE_SELF
+        )
+
+        for directory in (self.sites_available, self.sites_enabled, self.config_dir, self.certbot_live_dir):
+            self._add_watch(directory, mask)
+
+        for domain in self._list_names(self.certbot_live_dir):
+            self._watch_certificate_dir(domain)
+
+    def _watch_certificate_dir(self, domain: str) -> None:
+        directory = self.certbot_live_dir / domain
+        if directory.is_dir():
+            self._add_watch(
+                directory,
+                inotify_flags.CREATE | inotify_flags.DELETE | inotify_flags.MOVED_TO |
+                inotify_flags.MOVED_FROM | inotify_flags.CLOSE_WRITE | inotify_flags.DELETE_SELF
+            )
+
+    def _add_watch(self, directory: Path, mask: int) -> None:
+        if directory in self._watched_paths or not directory.is_dir():
+            return
+        try:
+            wd = self._inotify.add_watch(str(directory), mask)
+        except OSError as e:
+            logger.warning(f"Could not watch {directory}: {e}")
+            return
+        self._watches[wd] = directory
+        self._watched_paths[directory] = wd
+
+    def _read_events(self) -> None:
+        try:
+            events = self._inotify.read(timeout=0)
+        except OSError as e:
+            logger.error(f"Error reading inotify events: {e}")
+            return
+
+        changed = set()
+        needs_rescan = False
+
+        for event in events:
+            event_flags = inotify_flags.from_mask(event.mask)
+
+            if inotify_flags.Q_OVERFLOW in event_flags:
+                needs_rescan = True
+                continue
+
+            if inotify_flags.IGNORED in event_flags:
+                directory = self._watches.pop(event.wd, None)
+                if directory is not None:
+                    self._watched_paths.pop(directory, None)
+                continue
+
+            directory = self._watches.get(event.wd)
+            if directory is None:
+                continue
+
+            if inotify_flags.DELETE_SELF in event_flags or inotify_flags.MOVE_SELF in event_flags:
+                if directory.parent == self.certbot_live_dir:
+                    changed.add(directory.name)
+                else:
+                    needs_rescan = True
+                continue
+
+            domain = self._domain_for_event(directory, event.name)
+            if domain:
+                changed.add(domain)
+                if directory in (self.sites_available, self.sites_enabled):
+                    self.nginx_test_passed = None
+
+        if needs_rescan:
+            self.rescan()
+            return
+
+        for domain in changed:
+            self.refresh(domain)
+
+    def _domain_for_event(self, directory: Path, name: str) -> Optional[str]:
+        if directory == self.config_dir:
+            if not name.endswith(".conf"):
+                return None
+            return name[:-len(".conf")]
+        if directory.parent == self.certbot_live_dir:
+            return directory.name
+        return name or None
+
+    def _close_inotify(self) -> None:
+        if self._inotify is None:
+            return
+        try:
+            asyncio.get_running_loop().remove_reader(self._inotify.fileno())
+        except (RuntimeError, ValueError):
+            pass
+        self._inotify.close()
+        self._inotify = None
+        self._watches.clear()
+        self._watched_paths.clear()
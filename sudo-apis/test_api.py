@@ -9,20 +9,21 @@ API_BASE_URL = "http://localhost:8082"
 TEST_DOMAIN = "test.example.com"
 TEST_PROJECT_ID = "test_proj_123"
 
-def test_api_endpoint(method, endpoint, data=None):
+def test_api_endpoint(method, endpoint, data=None, headers=None, expected_status=200):
     try:
         url = f"{API_BASE_URL}{endpoint}"
         
         if method.upper() == "GET":
-            response = requests.get(url)
+            response = requests.get(url, headers=headers)
         elif method.upper() == "POST":
-            response = requests.post(url, json=data)
+            response = requests.post(url, json=data, headers=headers)
         else:
             raise ValueError(f"Unsupported method: {method}")
         
         return {
-            "success": response.status_code == 200,
+            "success": response.status_code == expected_status,
             "status_code": response.status_code,
+            "headers": response.headers,
             "data": response.json() if response.content else None
         }
     except requests.exceptions.ConnectionError:
@@ -53,6 +54,24 @@ def main():
     print("🚀 Testing Halogen Sudo API")
     print("=" * 50)
     
+    # A fresh key per run, so a key stored by an earlier run cannot turn the first request into a replay
+    idempotency_key = f"test-purge-{int(time.time())}"
+    stats_before = {}
+    
+    def record_idempotency_stats(result):
+        stats_before.update(result["data"]["data"])
+    
+    def expect_replayed(result):
+        if result["headers"].get("Idempotent-Replayed") != "true":
+            return "Second request with the same Idempotency-Key was not replayed"
+    
+    def expect_one_miss_one_hit(result):
+        stats = result["data"]["data"]
+        misses = stats["misses"] - stats_before["misses"]
+        hits = stats["hits"] - stats_before["hits"]
+        if (misses, hits) != (1, 1):
+            return f"Expected 1 miss and 1 hit, got {misses} misses and {hits} hits"
+    
     tests = [
         ("Health Check", "GET", "/health", None),
         ("Deploy Nginx Config (No SSL)", "POST", "/nginx/deploy", {
@@ -61,6 +80,22 @@ def main():
             "ssl_enabled": False
         }),
         ("Check Nginx Status", "GET", f"/nginx/status/{TEST_DOMAIN}", None),
+        ("Idempotency Stats (Before)", "GET", "/idempotency/stats", None, {
+            "check": record_idempotency_stats
+        }),
+        ("Purge Edge Cache (Idempotent)", "POST", "/cache/purge", {
+            "domain": TEST_DOMAIN
+        }, {"headers": {"Idempotency-Key": idempotency_key}}),
+        ("Purge Edge Cache (Idempotent Replay)", "POST", "/cache/purge", {
+            "domain": TEST_DOMAIN
+        }, {"headers": {"Idempotency-Key": idempotency_key}, "check": expect_replayed}),
+        ("Idempotency Stats", "GET", "/idempotency/stats", None, {
+            "check": expect_one_miss_one_hit
+        }),
+        ("Purge Edge Cache (Idempotency-Key Reused With Another Body)", "POST", "/cache/purge", {
+            "domain": TEST_DOMAIN,
+            "path": "/other"
+        }, {"headers": {"Idempotency-Key": idempotency_key}, "status": 422}),
         ("Generate SSL Certificate", "POST", "/ssl/generate", {
             "domain": TEST_DOMAIN,
             "project_id": TEST_PROJECT_ID,
@@ -68,11 +103,21 @@ def main():
             "force_renewal": False
         }),
         ("Check SSL Status", "GET", f"/ssl/status/{TEST_DOMAIN}", None),
+        ("Check Wildcard SSL Status", "GET", "/ssl/wildcard/status", None),
         ("Deploy Nginx Config (With SSL)", "POST", "/nginx/deploy", {
             "domain": TEST_DOMAIN,
             "project_id": TEST_PROJECT_ID,
             "ssl_enabled": True
         }),
+        ("Deploy Nginx Config (Tuned Profile)", "POST", "/nginx/deploy", {
+            "domain": TEST_DOMAIN,
+            "project_id": TEST_PROJECT_ID,
+            "ssl_enabled": True,
+            "profile": "tuned"
+        }),
+        ("Purge Edge Cache", "POST", "/cache/purge", {
+            "domain": TEST_DOMAIN
+        }),
         ("Complete Domain Setup", "POST", "/domain/setup", {
             "domain": f"setup-{TEST_DOMAIN}",
             "project_id": TEST_PROJECT_ID,
@@ -92,8 +137,16 @@ def main():
     passed = 0
     total = len(tests)
     
-    for test_name, method, endpoint, data in tests:
-        result = test_api_endpoint(method, endpoint, data)
+    for test_name, method, endpoint, data, *options in tests:
+        options = options[0] if options else {}
+        result = test_api_endpoint(method, endpoint, data, options.get("headers"), options.get("status", 200))
+        
+        if result.get("success") and options.get("check"):
+            error = options["check"](result)
+            if error:
+                result["success"] = False
+                result["error"] = error
+        
         print_test_result(test_name, result)
         
         if result.get("success"):